@@ -1,10 +1,11 @@
 from contextlib import contextmanager
 import os
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import load_only, sessionmaker, aliased
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import load_only, selectinload, sessionmaker, aliased
 
-from .models import Base, Law
+from .models import Attachment, Base, ContentItem, Law
 
 db_uri = os.environ.get("DB_URI") or "postgresql://localhost:5432/gadi"
 _engine = create_engine(db_uri)
@@ -15,6 +16,11 @@ def init_db():
     Base.metadata.create_all(_engine)
 
 
+def dispose_inherited_connections():
+    """Call in a forked child process so it opens its own DB connections instead of reusing the parent's."""
+    _engine.dispose(close=False)
+
+
 @contextmanager
 def session_scope():
     """Provide a transactional scope around a series of operations."""
@@ -29,8 +35,18 @@ def session_scope():
         session.close()
 
 
-def all_laws(session):
-    return session.query(Law).all()
+def _laws_with_contents_and_attachments():
+    return select(Law).options(selectinload(Law.contents), selectinload(Law.attachments))
+
+
+def all_law_ids(session):
+    return session.execute(select(Law.id).order_by(Law.id)).scalars().all()
+
+
+def find_laws_by_ids(session, ids):
+    """Load the given laws (ordered by id) with their contents and attachments."""
+    query = _laws_with_contents_and_attachments().where(Law.id.in_(ids)).order_by(Law.id)
+    return session.execute(query).scalars().all()
 
 
 def all_laws_load_only_gii_slug_and_source_timestamp(session):
@@ -54,13 +70,48 @@ def laws_with_duplicate_slugs(session):
     return [list(laws) for laws in dupes.values()]
 
 
-def find_law_by_doknr(session, doknr):
-    return session.query(Law).filter_by(doknr=doknr).first()
-
-
 def find_law_by_slug(session, slug):
     return session.query(Law).filter_by(slug=slug).first()
 
 
-def bulk_delete_laws_by_gii_slug(session, gii_slugs):
-    Law.__table__.delete().where(Law.gii_slug.in_(gii_slugs))
+def bulk_delete_laws_by_gii_slug(session, gii_slugs, chunk_size=1000):
+    gii_slugs = list(gii_slugs)
+    for i in range(0, len(gii_slugs), chunk_size):
+        session.execute(Law.__table__.delete().where(Law.gii_slug.in_(gii_slugs[i:i + chunk_size])))
+
+
+def upsert_law(session, law_attrs):
+    """
+    Insert a law, or update it in place if one with the same doknr exists, and delete its contents and attachments
+    so they can be re-inserted. Returns the law's id.
+    """
+    insert = postgresql.insert(Law).values(**law_attrs)
+    upsert = insert.on_conflict_do_update(
+        index_elements=[Law.doknr],
+        set_={name: insert.excluded[name] for name in law_attrs},
+    ).returning(Law.id)
+    law_id = session.execute(upsert).scalar_one()
+
+    session.execute(delete(ContentItem).where(ContentItem.law_id == law_id))
+    session.execute(delete(Attachment).where(Attachment.law_id == law_id))
+
+    return law_id
+
+
+def reserve_ids(session, model, count):
+    """Allocate primary keys for count new rows of model in a single round trip."""
+    sequence_name = f"{model.__tablename__}_id_seq"
+    query = select(func.nextval(sequence_name)).select_from(func.generate_series(1, count))
+    return session.execute(query).scalars().all()
+
+
+def bulk_insert_contents(session, law_id, content_item_dicts):
+    ids = reserve_ids(session, ContentItem, len(content_item_dicts))
+    session.bulk_insert_mappings(ContentItem, ContentItem.mappings_from_dicts(content_item_dicts, law_id, ids))
+
+
+def bulk_insert_attachments(session, law_id, attachments):
+    session.bulk_insert_mappings(Attachment, [
+        dict(law_id=law_id, name=name, data_uri=data_uri)
+        for name, data_uri in attachments.items()
+    ])
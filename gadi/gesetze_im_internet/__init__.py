@@ -1,14 +1,32 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
 import gzip
-import json
+import io
+import multiprocessing
 import os
 import sys
 import tarfile
+import time
+
+import orjson
 import tqdm
 
 from gadi import api_schemas, db, models
 from .parsing import parse_law
 from .download import fetch_toc, has_update
 
+INGEST_COMMIT_BATCH_SIZE = 100
+DOWNLOAD_THREADS = 32
+JSON_GENERATION_BATCH_SIZE = 64
+# Each worker holds its own DB connection, so stay well below Postgres' default max_connections (100).
+JSON_GENERATION_MAX_WORKERS = 8
+# Batches queued or finished but not yet written, per worker process. Keeps the parent's memory bounded when
+# compressing the archives can't keep up with the workers.
+JSON_GENERATION_BATCHES_IN_FLIGHT_PER_WORKER = 2
+# gzip level for the bulk archives: 1 is fastest, 9 gives the smallest files.
+DEFAULT_COMPRESSLEVEL = 6
+
 
 def _calculate_diff(previous_slugs, current_slugs):
     previous_slugs = set(previous_slugs)
@@ -25,12 +43,15 @@ def _calculate_diff(previous_slugs, current_slugs):
     return existing, new, removed
 
 
-def _loop_with_progress(slugs, desc):
+def _loop_with_progress(slugs, desc, total=None):
+    if total is None:
+        total = len(slugs)
+
     pbar = None
     if sys.stdout.isatty():
-        pbar = tqdm.tqdm(total=len(slugs), desc=desc)
+        pbar = tqdm.tqdm(total=total, desc=desc)
     else:
-        print(desc, '-', len(slugs))
+        print(desc, '-', total)
 
     for slug in slugs:
         yield slug
@@ -41,6 +62,21 @@ def _loop_with_progress(slugs, desc):
         pbar.close()
 
 
+def _map_concurrently(fn, slugs, desc):
+    """
+    Call fn for each slug on a thread pool (for network-bound work) and yield (slug, result) pairs in order of
+    completion.
+    """
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_THREADS) as executor:
+        futures = {executor.submit(fn, slug): slug for slug in slugs}
+        try:
+            for future in _loop_with_progress(as_completed(futures), desc, total=len(futures)):
+                yield futures[future], future.result()
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
 def _check_for_updates(slugs, check_fn):
     updated = set()
 
@@ -51,11 +87,24 @@ def _check_for_updates(slugs, check_fn):
     return updated
 
 
+def _check_for_updates_concurrently(slugs, check_fn):
+    return {
+        slug
+        for slug, is_updated in _map_concurrently(check_fn, slugs, "Checking existing laws for updates")
+        if is_updated
+    }
+
+
 def _add_or_replace(slugs, add_fn):
     for slug in _loop_with_progress(slugs, "Adding new and updated laws"):
         add_fn(slug)
 
 
+def _add_or_replace_concurrently(slugs, add_fn):
+    for _ in _map_concurrently(add_fn, slugs, "Adding new and updated laws"):
+        pass
+
+
 def _delete_removed(slugs, delete_fn):
     for slug in _loop_with_progress(slugs, "Deleting removed laws"):
         delete_fn(slug)
@@ -69,10 +118,14 @@ def download_laws(location):
     laws_on_disk = location.list_slugs_with_timestamps()
     existing, new, removed = _calculate_diff(laws_on_disk.keys(), download_urls.keys())
 
-    updated = _check_for_updates(existing, lambda slug: has_update(download_urls[slug], laws_on_disk[slug]))
+    updated = _check_for_updates_concurrently(
+        existing, lambda slug: has_update(download_urls[slug], laws_on_disk[slug])
+    )
     new_or_updated = new.union(updated)
 
-    _add_or_replace(new_or_updated, lambda slug: location.create_or_replace_law(slug, download_urls[slug]))
+    _add_or_replace_concurrently(
+        new_or_updated, lambda slug: location.create_or_replace_law(slug, download_urls[slug])
+    )
 
     _delete_removed(removed, lambda slug: location.remove_law(slug))
 
@@ -97,91 +150,171 @@ def _fixup_slug_duplicates(session):
 
 def ingest_data_from_location(session, location):
     print("Loading timestamps")
-    laws_on_disk = location.list_slugs_with_timestamps()
+    laws_on_disk = location.list_laws()
     laws_in_db = {
         law.gii_slug: law.source_timestamp
         for law in db.all_laws_load_only_gii_slug_and_source_timestamp(session)
     }
     existing, new, removed = _calculate_diff(laws_in_db.keys(), laws_on_disk.keys())
 
-    updated = _check_for_updates(existing, lambda slug: laws_on_disk[slug] > laws_in_db[slug])
+    updated = _check_for_updates(existing, lambda slug: laws_on_disk[slug].timestamp > laws_in_db[slug])
     new_or_updated = new.union(updated)
 
+    ingested_count = 0
+
     def add_fn(slug):
-        ingest_law(session, location, slug)
-        session.commit()
+        nonlocal ingested_count
+        ingest_law(session, location, slug, laws_on_disk[slug])
+        ingested_count += 1
+        # Committing every single law forces a WAL flush each time, so commit in batches instead.
+        if ingested_count % INGEST_COMMIT_BATCH_SIZE == 0:
+            session.commit()
 
     _add_or_replace(new_or_updated, add_fn)
-    _fixup_slug_duplicates(session)
 
+    # Delete before fixing up slugs, so that removed laws don't count as duplicates.
     print("Deleting removed laws")
     db.bulk_delete_laws_by_gii_slug(session, removed)
-    session.commit()
 
+    _fixup_slug_duplicates(session)
 
-def ingest_law(session, location, gii_slug):
-    law_dict = parse_law(location.xml_file_for(gii_slug))
-    law_dict["attachments"] = location.attachments(gii_slug)
-    law = models.Law.from_dict(law_dict, gii_slug)
 
-    existing_law = db.find_law_by_doknr(session, law.doknr)
-    if existing_law:
-        session.delete(existing_law)
-        session.flush()
-    session.add(law)
+def ingest_law(session, location, gii_slug, law_files=None):
+    law_files = law_files or location.law_files(gii_slug)
+    law_dict = parse_law(law_files.xml_file)
+    attachments = location.read_attachments(law_files)
 
-    return law
+    # Replace the law's contents and attachments in bulk rather than row by row.
+    law_id = db.upsert_law(session, models.Law.attrs_from_dict(law_dict, gii_slug))
+    db.bulk_insert_contents(session, law_id, law_dict["contents"])
+    db.bulk_insert_attachments(session, law_id, attachments)
 
+    return law_id
 
-def _write_file(filepath, content):
-    with open(filepath, "w") as f:
-        f.write(content + "\n")
 
+def _dump_json(obj):
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
 
-def _write_gzipped_file(filepath, content):
-    with gzip.open(filepath, "wb") as f:
-        f.write((content + "\n").encode("utf-8"))
 
+def _write_file(filepath, content):
+    with open(filepath, "wb") as f:
+        f.write(content)
+
+
+def _add_dir_to_tarfile(tf, name, mtime):
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.type = tarfile.DIRTYPE
+    tarinfo.mode = 0o755
+    tarinfo.mtime = mtime
+    tf.addfile(tarinfo)
+
+
+def _add_file_to_tarfile(tf, name, content, mtime):
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.size = len(content)
+    tarinfo.mode = 0o644
+    tarinfo.mtime = mtime
+    tf.addfile(tarinfo, io.BytesIO(content))
+
+
+def _init_json_generation_worker():
+    db.dispose_inherited_connections()
+
+
+def _imap_bounded(pool, fn, iterable, max_in_flight):
+    """
+    Like pool.imap (results come back in order), but only keeps max_in_flight tasks submitted at a time, so results
+    don't pile up when the consumer is slower than the workers.
+    """
+    pending = deque()
+    for item in iterable:
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(fn, (item,)))
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def _generate_law_json_for_ids(law_ids, laws_path):
+    """
+    Serialize a batch of laws (runs in a worker process), writing each law's JSON file to laws_path unless it's None.
+    Returns each law's JSON file content, its compact JSON for the bundle and its index entry.
+    """
+    results = []
+    with db.session_scope() as session:
+        for law in db.find_laws_by_ids(session, law_ids):
+            law_dict = api_schemas.LawAllFields.from_orm_model(law, include_contents=True).dict()
+            law_json = _dump_json({"data": law_dict})
+            if laws_path:
+                _write_file(f"{laws_path}/{law.slug}.json", law_json)
+
+            index_entry = dict(
+                abbreviation=law.abbreviation,
+                slug=law.slug,
+                name=law.title_short or law.title_long,
+                source_timestamp=law.source_timestamp,
+            )
+            results.append((law_json, orjson.dumps(law_dict), index_entry))
+
+    return results
+
+
+def write_all_law_json_files(session, dir_path, compresslevel=DEFAULT_COMPRESSLEVEL, write_law_files=True):
+    """
+    Write all_laws.json.gz and all_laws.tar.gz (one file per law plus an index) to dir_path, and with
+    write_law_files also the individual files to dir_path/laws.
+    """
+    os.makedirs(dir_path, exist_ok=True)
+    laws_path = None
+    if write_law_files:
+        laws_path = dir_path + "/laws"
+        os.makedirs(laws_path, exist_ok=True)
+
+    law_ids = db.all_law_ids(session)
+    law_id_batches = [
+        law_ids[i:i + JSON_GENERATION_BATCH_SIZE] for i in range(0, len(law_ids), JSON_GENERATION_BATCH_SIZE)
+    ]
+    generate_batch = functools.partial(_generate_law_json_for_ids, laws_path=laws_path)
+
+    processes = max(1, min(os.cpu_count() or 1, len(law_id_batches), JSON_GENERATION_MAX_WORKERS))
+    laws_index = []
+    mtime = time.time()
 
-def write_all_law_json_files(session, dir_path):
-    laws_path = dir_path + "/laws"
-    os.makedirs(laws_path, exist_ok=True)
+    # Serializing is CPU-bound, so fan the laws out over several cores. Both archives are streamed from here in id
+    # order as the batches come back, instead of collecting all laws in memory (or reading the files back from disk).
+    with multiprocessing.Pool(processes, initializer=_init_json_generation_worker) as pool, \
+            gzip.open(f"{dir_path}/all_laws.json.gz", "wb", compresslevel=compresslevel) as all_laws_file, \
+            tarfile.open(f"{dir_path}/all_laws.tar.gz", "w:gz", compresslevel=compresslevel) as tf:
+        all_laws_file.write(b'{"data":[')
+        _add_dir_to_tarfile(tf, "laws", mtime)
 
-    all_laws = []
-    laws_index = []
+        max_in_flight = processes * JSON_GENERATION_BATCHES_IN_FLIGHT_PER_WORKER
+        for batch_results in _imap_bounded(pool, generate_batch, law_id_batches, max_in_flight):
+            for law_json, bundle_json, index_entry in batch_results:
+                if laws_index:
+                    all_laws_file.write(b",")
+                all_laws_file.write(bundle_json)
+                _add_file_to_tarfile(tf, f"laws/{index_entry['slug']}.json", law_json, mtime)
+                laws_index.append(index_entry)
 
-    for law in db.all_laws(session):
-        law_api_model = api_schemas.LawAllFields.from_orm_model(law, include_contents=True)
-        single_law_response = api_schemas.LawResponse(data=law_api_model)
-        _write_file(f"{laws_path}/{law.slug}.json", single_law_response.json(indent=2))
+        all_laws_file.write(b"]}\n")
 
-        all_laws.append(law_api_model.dict())
-        laws_index.append(dict(
-            abbreviation=law.abbreviation,
-            slug=law.slug,
-            name=law.title_short or law.title_long,
-            source_timestamp=law.source_timestamp,
-        ))
+        sorted_laws_index = sorted(laws_index, key=lambda l: l["abbreviation"])
+        index_json = _dump_json(sorted_laws_index)
+        _add_file_to_tarfile(tf, "laws/__index.json", index_json, mtime)
 
-    _write_gzipped_file(f"{dir_path}/all_laws.json.gz", json.dumps({'data': all_laws}, indent=2))
-    sorted_laws_index = sorted(laws_index, key=lambda l: l["abbreviation"])
-    _write_file(f"{laws_path}/__index.json", json.dumps(sorted_laws_index, indent=2))
+    if laws_path:
+        _write_file(f"{laws_path}/__index.json", index_json)
 
 
 def write_law_json_file(law, dir_path):
     filepath = f"{dir_path}/{law.slug}.json"
     law_schema = api_schemas.LawAllFields.from_orm_model(law, include_contents=True)
     response = api_schemas.LawResponse(data=law_schema)
-    _write_file(filepath, response.json(indent=2))
-
-
-def generate_static_assets(session, output_dir):
-    tarfilename = "all_laws.tar.gz"
+    _write_file(filepath, _dump_json(response.dict()))
 
-    print("Generating json files")
-    write_all_law_json_files(session, output_dir)
 
-    print("Creating tarball")
-    tarfilepath = f"{output_dir}/{tarfilename}"
-    with tarfile.open(tarfilepath, "w:gz") as tf:
-        tf.add(output_dir + "/laws", arcname="laws")
+def generate_static_assets(session, output_dir, compresslevel=DEFAULT_COMPRESSLEVEL, write_law_files=True):
+    print("Generating json files and archives")
+    write_all_law_json_files(session, output_dir, compresslevel=compresslevel, write_law_files=write_law_files)
@@ -1,7 +1,7 @@
 import base64
+from collections import namedtuple
 import datetime as dt
 from email.utils import parsedate_to_datetime
-import glob
 from io import BytesIO
 import mimetypes
 import os
@@ -53,6 +53,15 @@ def location_from_string(location_string):
     return LocalPathLocation(location_string)
 
 
+class LawFiles(namedtuple("LawFiles", ["dir_path", "timestamp", "xml_files", "attachment_files"])):
+    """Result of scanning a law's data directory."""
+
+    @property
+    def xml_file(self):
+        assert len(self.xml_files) == 1, f"Expected 1 XML file in {self.dir_path}, got {len(self.xml_files)}"
+        return self.xml_files[0]
+
+
 class LocalPathLocation:
     def __init__(self, location_string):
         self.data_dir = location_string
@@ -76,35 +85,53 @@ class LocalPathLocation:
         with open(dir_path + "/.timestamp", "w") as f:
             f.write(timestamp)
 
-    def list_slugs_with_timestamps(self):
+    def _scan_law_dir(self, dir_path):
+        timestamp = None
+        xml_files = []
+        attachment_files = []
+
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.name == ".timestamp":
+                    with open(entry.path) as f:
+                        timestamp = f.read()
+                elif entry.name.startswith(".") or not entry.is_file():
+                    continue
+                elif entry.name.endswith(".xml"):
+                    xml_files.append(entry.path)
+                else:
+                    attachment_files.append(entry.path)
+
+        return LawFiles(dir_path, timestamp, xml_files, attachment_files)
+
+    def list_laws(self):
+        """Scan all law directories in one go, so per-law work doesn't need to hit the file system again."""
         result = {}
 
-        for path in glob.glob(f"{self.data_dir}/*/"):
-            slug = path.split("/")[-2]
-            try:
-                with open(path + ".timestamp") as f:
-                    result[slug] = f.read()
-            except FileNotFoundError:
-                print(f"Warning: No .timestamp in {path}")
-                result[slug] = "00000000"
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir() or entry.name.startswith("."):
+                    continue
+                law_files = self._scan_law_dir(entry.path)
+                if law_files.timestamp is None:
+                    print(f"Warning: No .timestamp in {entry.path}/")
+                    law_files = law_files._replace(timestamp="00000000")
+                result[entry.name] = law_files
 
         return result
 
-    def xml_file_for(self, slug):
-        law_dir = os.path.join(self.data_dir, slug)
-        xml_files = glob.glob(f"{law_dir}/*.xml")
-        assert len(xml_files) == 1, f"Expected 1 XML file in {law_dir}, got {len(xml_files)}"
+    def list_slugs_with_timestamps(self):
+        return {slug: law_files.timestamp for slug, law_files in self.list_laws().items()}
 
-        return xml_files[0]
+    def law_files(self, slug):
+        return self._scan_law_dir(os.path.join(self.data_dir, slug))
 
-    def attachments(self, slug):
-        law_dir = os.path.join(self.data_dir, slug)
-        all_files = glob.glob(f"{law_dir}/*")
-        attachments = {}
-        for path in all_files:
-            if path.endswith(".xml"):
-                continue
+    def xml_file_for(self, slug):
+        return self.law_files(slug).xml_file
 
+    def read_attachments(self, law_files):
+        attachments = {}
+        for path in law_files.attachment_files:
             mimetype, _ = mimetypes.guess_type(path, strict=False)
             with open(path, "rb") as file:
                 data = file.read()
@@ -113,3 +140,6 @@ class LocalPathLocation:
 
             attachments[os.path.basename(path)] = data_uri
         return attachments
+
+    def attachments(self, slug):
+        return self.read_attachments(self.law_files(slug))
@@ -1,146 +1,127 @@
 import itertools
-import xml.etree.ElementTree as ET
 
-import declxml as xml
-from declxml import _PrimitiveValue, _string_parser, _hooks_apply_after_parse
 from lxml import etree
 
-from .utils import chunk_string
 
+EMPTY_CONTENT_PATTERNS = ["<P/>", "<P />", "<P>-</P>"]
+_EMPTY_CONTENT = frozenset([""] + EMPTY_CONTENT_PATTERNS)
+def _none_if_empty(text):
+    return None if text in _EMPTY_CONTENT else text
 
-class _XmlPreservingStringValue(_PrimitiveValue):
-    """
-    Hack to get at the element so we can serialize its content & children
-    (instead of just getting the element text).
-    Scaffolding copied from https://github.com/gatkin/declxml/blob/8cc2ff2fa813aa9d4c27d1964fe7d865029a1298/declxml.py
-    """
-    def parse_at_element(
-        self,
-        element,  # type: ET.Element
-        state  # type: _ProcessorState
-    ):
-        # type: (...) -> Any
-        """Parse the primitive value at the XML element."""
-        if self._attribute:
-            parsed_value = self._parse_attribute(element, self._attribute, state)
-        else:
-            serialised_element_content = "".join(
-                itertools.chain([element.text or ""], (ET.tostring(child, encoding="unicode") for child in element))
-            )
-            parsed_value = self._parser_func(serialised_element_content, state)
-
-        return _hooks_apply_after_parse(self._hooks, state, parsed_value)
-
-
-def node_as_string(
-    element_name,  # type: Text
-    attribute=None,  # type: Optional[Text]
-    required=True,  # type: bool
-    alias=None,  # type: Optional[Text]
-    default='',  # type: Optional[Text]
-    omit_empty=False,  # type: bool
-    strip_whitespace=True,  # type: bool
-    hooks=None  # type: Optional[Hooks]
-):
-    # type: (...) -> Processor
-    """
-    Custom processor for extractingXml nodes as strings. Used because some
-    fields contain embedded tags.
-    :param strip_whitespace: Indicates whether leading and trailing whitespace should be stripped
-        from parsed string values.
-    """
 
-    value_parser = _string_parser(strip_whitespace)
-    return _XmlPreservingStringValue(
-        element_name,
-        value_parser,
-        attribute,
-        required,
-        alias,
-        default,
-        omit_empty,
-        hooks
-    )
+_XP_JURABK = etree.XPath("metadaten/jurabk")
+_XP_AMTABK = etree.XPath("metadaten/amtabk")
+_XP_FIRST_PUBLISHED = etree.XPath("metadaten/ausfertigung-datum")
+_XP_TITLE_LONG = etree.XPath("metadaten/langue")
+_XP_TITLE_SHORT = etree.XPath("metadaten/kurzue")
+_XP_PUBLICATION_INFO = etree.XPath("metadaten/fundstelle")
+_XP_PERIODICAL = etree.XPath("periodikum")
+_XP_REFERENCE = etree.XPath("zitstelle")
+_XP_STATUS_INFO = etree.XPath("metadaten/standangabe")
+_XP_STATUS_CATEGORY = etree.XPath("standtyp")
+_XP_STATUS_COMMENT = etree.XPath("standkommentar")
+_XP_NAME = etree.XPath("metadaten/enbez")
+_XP_TITLE = etree.XPath("metadaten/titel")
 
 
-EMPTY_CONTENT_PATTERNS = ["<P/>", "<P />", "<P>-</P>"]
-def _content_string_hooks_after_parse(_, text):
-    if text == '' or any(text == pat for pat in EMPTY_CONTENT_PATTERNS):
+def _first(elements):
+    return elements[0] if elements else None
+
+
+def _text(element):
+    if element is None:
         return None
-    return text
-
-content_string_hooks = xml.Hooks(after_parse=_content_string_hooks_after_parse)
-
-text_processor = xml.dictionary("textdaten/text", [
-        node_as_string("Content", required=False, hooks=content_string_hooks),
-        node_as_string("TOC", required=False, default=None),
-        node_as_string("Footnotes", required=False, default=None),
-    ], required=False, alias="text")
-
-header_norm_processor = xml.dictionary("norm", [
-    xml.array(xml.string("metadaten/jurabk", alias="jurabk")),
-    xml.array(xml.string("metadaten/amtabk", alias="amtabk", required=False)),
-    xml.string("metadaten/ausfertigung-datum", alias="first_published"),
-    xml.string(".", attribute="doknr"),
-    xml.string(".", attribute="builddate", alias="source_timestamp"),
-    node_as_string("metadaten/langue", alias="title_long"),
-    node_as_string("metadaten/kurzue", alias="title_short", required=False, default=None),
-    text_processor,
-    xml.array(xml.dictionary("metadaten/fundstelle", [
-        xml.string("periodikum", alias="periodical"),
-        xml.string("zitstelle", alias="reference")
-    ], required=False), alias="publication_info"),
-    xml.array(xml.dictionary("metadaten/standangabe", [
-        xml.string("standtyp", alias="category"),
-        node_as_string("standkommentar", alias="comment")
-    ], required=False), alias="status_info"),
-    node_as_string("textdaten/fussnoten/Content", required=False, default=None, alias="notes_documentary_footnotes", hooks=content_string_hooks),
-])
-
-body_norm_processor = xml.dictionary("norm", [
-    xml.string(".", attribute="doknr"),
-    text_processor,
-    node_as_string("textdaten/fussnoten/Content", required=False, default=None, alias="documentary_footnotes", hooks=content_string_hooks),
-    xml.string("metadaten/enbez", alias="name", required=False, default=None),
-    node_as_string("metadaten/titel", alias="title", required=False, default=None, hooks=content_string_hooks),
-    xml.dictionary("metadaten/gliederungseinheit", [
-        xml.string("gliederungskennzahl", alias="code"),
-        xml.string("gliederungsbez", alias="name"),
-        node_as_string("gliederungstitel", alias="title", required=False, default=None, hooks=content_string_hooks),
-    ], required=False, alias="section_info")
-])
+    return (element.text or "").strip()
 
 
-def load_norms_from_file(file_or_filepath):
-    if hasattr(file_or_filepath, "read"):
-        doc = etree.parse(file_or_filepath)
-    else:
-        with open(file_or_filepath) as f:
-            doc = etree.parse(f)
+def _serialize_child(child):
+    # lxml writes empty elements as "<BR/>", while our output has always used ElementTree's "<BR />".
+    return etree.tostring(child, encoding="unicode").replace("/>", " />")
 
-    return doc.xpath("/dokumente/norm")
 
+def _text_with_tags(element):
+    """Like _text, but keeps embedded tags (some fields contain formatting markup)."""
+    if element is None:
+        return None
+    return "".join(itertools.chain([element.text or ""], (_serialize_child(child) for child in element))).strip()
 
-def apply_transformer(dict, transform_func, replace=None, read=None):
-    args = [dict.pop(key) for key in replace or []] + [dict[key] for key in read or []]
-    new_entries = transform_func(*args)
-    dict.update(new_entries)
 
+def _first_children_by_tag(element, tags):
+    """Find the first child for each of the given tags in a single pass over the element's children."""
+    found = dict.fromkeys(tags)
+    for child in element:
+        if child.tag in found and found[child.tag] is None:
+            found[child.tag] = child
+    return found
 
-def transform_notes_text(text_dict):
-    return {
-        "notes_body": text_dict.get("Content") or text_dict.get("TOC"),
-        "notes_footnotes": text_dict.get("Footnotes")
-    }
+
+def _parse_texts(norm):
+    """Body, footnotes and documentary footnotes of a norm, collected in one walk over its textdaten."""
+    texts = {"body": None, "footnotes": None, "documentary_footnotes": None}
+
+    textdaten = norm.find("textdaten")
+    if textdaten is None:
+        return texts
+    containers = _first_children_by_tag(textdaten, ["text", "fussnoten"])
+
+    if containers["text"] is not None:
+        parts = _first_children_by_tag(containers["text"], ["Content", "TOC", "Footnotes"])
+        texts["body"] = _none_if_empty(_text_with_tags(parts["Content"])) or _text_with_tags(parts["TOC"])
+        texts["footnotes"] = _text_with_tags(parts["Footnotes"])
+
+    if containers["fussnoten"] is not None:
+        texts["documentary_footnotes"] = _none_if_empty(_text_with_tags(containers["fussnoten"].find("Content")))
+
+    return texts
 
 
-def transform_text(text_dict):
+def _parse_section_info(norm):
+    section_info = norm.find("metadaten/gliederungseinheit")
+    if section_info is None:
+        return None
+
     return {
-        "body": text_dict.get("Content") or text_dict.get("TOC"),
-        "footnotes": text_dict.get("Footnotes")
+        "code": _text(section_info.find("gliederungskennzahl")),
+        "name": _text(section_info.find("gliederungsbez")),
+        "title": _none_if_empty(_text_with_tags(section_info.find("gliederungstitel"))),
     }
 
 
+# The documents don't rely on entities or ID lookups, and comments/processing instructions aren't part of any
+# content we extract. Large laws can exceed libxml2's default size limits.
+_PARSER_OPTIONS = dict(
+    resolve_entities=False,
+    collect_ids=False,
+    remove_comments=True,
+    remove_pis=True,
+    huge_tree=True,
+)
+
+
+def _iter_norms(file):
+    for _, norm in etree.iterparse(file, events=("end",), tag="norm", **_PARSER_OPTIONS):
+        yield norm
+        # The consumer is done with this norm (and all previous ones) - free them to keep memory use flat.
+        norm.clear()
+        while norm.getprevious() is not None:
+            del norm.getparent()[0]
+
+
+def load_norms_from_file(file_or_filepath):
+    """Stream the norm elements of a file. Each norm is discarded as soon as the next one is requested."""
+    if hasattr(file_or_filepath, "read"):
+        yield from _iter_norms(file_or_filepath)
+    else:
+        with open(file_or_filepath, "rb") as f:
+            yield from _iter_norms(f)
+
+
+def apply_transformer(dict, transform_func, replace=None, read=None):
+    args = [dict.pop(key) for key in replace or []] + [dict[key] for key in read or []]
+    new_entries = transform_func(*args)
+    dict.update(new_entries)
+
+
 def transform_abbreviations(amtabk, jurabk):
     primary, *rest = list(dict.fromkeys(amtabk + jurabk))
     return {
@@ -179,11 +160,10 @@ def _find_parent(sections_by_code, code):
     Search by iteratively removing 3 digits from the end of the code to find a
     match among already-added sections.
     """
-    chunks = chunk_string(code, 3)
-    for i in reversed(range(len(chunks) + 1)):
-        substring = "".join(chunks[:i])
-        if sections_by_code.get(substring):
-            return sections_by_code[substring]
+    for end in range(len(code) // 3 * 3, -1, -3):
+        parent = sections_by_code.get(code[:end])
+        if parent:
+            return parent
     return None
 
 
@@ -205,10 +185,33 @@ def _set_parent(item, parser_state):
 
 
 def extract_law_attrs(header_norm):
-    law_dict = xml.parse_from_string(header_norm_processor, etree.tostring(header_norm, encoding="unicode"))
-    apply_transformer(
-        law_dict, transform_notes_text, replace=["text"]
-    )
+    texts = _parse_texts(header_norm)
+    law_dict = {
+        "jurabk": [_text(el) for el in _XP_JURABK(header_norm)],
+        "amtabk": [_text(el) for el in _XP_AMTABK(header_norm)],
+        "first_published": _text(_first(_XP_FIRST_PUBLISHED(header_norm))),
+        "doknr": header_norm.get("doknr"),
+        "source_timestamp": header_norm.get("builddate"),
+        "title_long": _text_with_tags(_first(_XP_TITLE_LONG(header_norm))),
+        "title_short": _text_with_tags(_first(_XP_TITLE_SHORT(header_norm))),
+        "notes_body": texts["body"],
+        "notes_footnotes": texts["footnotes"],
+        "notes_documentary_footnotes": texts["documentary_footnotes"],
+        "publication_info": [
+            {
+                "periodical": _text(_first(_XP_PERIODICAL(el))),
+                "reference": _text(_first(_XP_REFERENCE(el))),
+            }
+            for el in _XP_PUBLICATION_INFO(header_norm)
+        ],
+        "status_info": [
+            {
+                "category": _text(_first(_XP_STATUS_CATEGORY(el))),
+                "comment": _text_with_tags(_first(_XP_STATUS_COMMENT(el))),
+            }
+            for el in _XP_STATUS_INFO(header_norm)
+        ],
+    }
     apply_transformer(
         law_dict, transform_abbreviations, replace=["amtabk", "jurabk"]
     )
@@ -225,10 +228,13 @@ def extract_contents(body_norms):
 
     content_items = []
     for norm in body_norms:
-        item = xml.parse_from_string(body_norm_processor, etree.tostring(norm, encoding="unicode"))
-        apply_transformer(
-            item, transform_text, replace=["text"],
-        )
+        item = {
+            "doknr": norm.get("doknr"),
+            **_parse_texts(norm),
+            "name": _text(_first(_XP_NAME(norm))),
+            "title": _none_if_empty(_text_with_tags(_first(_XP_TITLE(norm)))),
+            "section_info": _parse_section_info(norm),
+        }
         apply_transformer(
             item, transform_item_type, read=["doknr", "body"]
         )
@@ -247,9 +253,14 @@ def extract_contents(body_norms):
 
 
 def parse_law(file_or_filepath):
-    header_norm, *body_norms = load_norms_from_file(file_or_filepath)
+    norms = load_norms_from_file(file_or_filepath)
+
+    try:
+        header_norm = next(norms)
+    except StopIteration:
+        raise ValueError(f"No norms found in {file_or_filepath}") from None
 
     law_attrs = extract_law_attrs(header_norm)
-    law_attrs["contents"] = extract_contents(body_norms)
+    law_attrs["contents"] = extract_contents(norms)
 
     return law_attrs
@@ -8,16 +8,16 @@ from sqlalchemy.orm import relationship
 Base = declarative_base()
 
 
+_UMLAUT_TRANSCRIPTIONS = str.maketrans({"ß": "ss", "ä": "ae", "ö": "oe", "ü": "ue"})
+_NON_ALPHANUMERIC_RUNS = re.compile("[^a-z0-9]+")
+
+
 def slugify(string):
     string = string.lower()
     # Transcribe umlauts etc.
-    for orig, repl in [("ß", "ss"), ("ä", "ae"), ("ö", "oe"), ("ü", "ue")]:
-        string = string.replace(orig, repl)
-    # Replace other characters with underscore
-    string = re.sub("[^a-z0-9]", "_", string)
-    # Collapse consecutive underscores
-    string = re.sub("_+", "_", string)
-    return string
+    string = string.translate(_UMLAUT_TRANSCRIPTIONS)
+    # Replace (runs of) other characters with a single underscore
+    return _NON_ALPHANUMERIC_RUNS.sub("_", string)
 
 
 class Law(Base):
@@ -56,26 +56,25 @@ class Law(Base):
     )
 
     @staticmethod
-    def from_dict(law_dict, gii_slug):
-        law = Law(
+    def attrs_from_dict(law_dict, gii_slug):
+        """Column values for the law itself (without contents)."""
+        return dict(
+            doknr=law_dict["doknr"],
             slug=slugify(law_dict["abbreviation"]),
             gii_slug=gii_slug,
-            **{k: v for k, v in law_dict.items() if k not in ["contents", "attachments"]}
+            abbreviation=law_dict["abbreviation"],
+            extra_abbreviations=law_dict["extra_abbreviations"],
+            first_published=law_dict["first_published"],
+            source_timestamp=law_dict["source_timestamp"],
+            title_long=law_dict["title_long"],
+            title_short=law_dict["title_short"],
+            publication_info=law_dict["publication_info"],
+            status_info=law_dict["status_info"],
+            notes_body=law_dict["notes_body"],
+            notes_footnotes=law_dict["notes_footnotes"],
+            notes_documentary_footnotes=law_dict["notes_documentary_footnotes"],
         )
 
-        content_item_dicts = law_dict["contents"]
-        content_items_by_doknr = {}
-        for idx, content_item_dict in enumerate(content_item_dicts):
-            content_item = ContentItem.from_dict(content_item_dict, idx, content_items_by_doknr)
-            content_items_by_doknr[content_item.doknr] = content_item
-            law.contents.append(content_item)
-
-        attachments_dict = law_dict["attachments"]
-        for name, data_uri in attachments_dict.items():
-            law.attachments.append(Attachment(name=name, data_uri=data_uri))
-
-        return law
-
 
 class ContentItem(Base):
     __tablename__ = "content_items"
@@ -96,13 +95,31 @@ class ContentItem(Base):
     parent = relationship("ContentItem", remote_side=[id], uselist=False)
 
     @staticmethod
-    def from_dict(content_item_dict, order, content_items_by_doknr):
-        parent_dict = content_item_dict["parent"]
-        parent = parent_dict and content_items_by_doknr[parent_dict["doknr"]]
-
-        content_item_attrs = {k: v for k, v in content_item_dict.items() if k != "parent"}
-        content_item = ContentItem(parent=parent, order=order, **content_item_attrs)
-        return content_item
+    def mappings_from_dicts(content_item_dicts, law_id, ids):
+        """
+        Rows for bulk-inserting a law's contents. Primary keys need to be allocated up front
+        (see db.reserve_ids) so that items can reference their parents.
+        """
+        ids_by_doknr = {}
+        mappings = []
+        for order, (content_item_dict, id) in enumerate(zip(content_item_dicts, ids)):
+            parent_dict = content_item_dict["parent"]
+            mappings.append(dict(
+                id=id,
+                doknr=content_item_dict["doknr"],
+                item_type=content_item_dict["item_type"],
+                name=content_item_dict["name"],
+                title=content_item_dict["title"],
+                body=content_item_dict["body"],
+                footnotes=content_item_dict["footnotes"],
+                documentary_footnotes=content_item_dict["documentary_footnotes"],
+                law_id=law_id,
+                parent_id=parent_dict and ids_by_doknr[parent_dict["doknr"]],
+                order=order,
+            ))
+            ids_by_doknr[content_item_dict["doknr"]] = id
+
+        return mappings
 
 
 class Attachment(Base):
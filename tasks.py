@@ -129,13 +129,21 @@ ns.add_collection(Collection(
 
 # Deployment-related tasks
 
-@task
-def generate_static_assets(c, output_dir):
+@task(
+    help={
+        "compresslevel": "gzip level for the bulk archives (1 = fastest, 9 = smallest)",
+        "write-law-files": "Also write the individual law files to <output-dir>/laws (default: yes)",
+    }
+)
+def generate_static_assets(c, output_dir, compresslevel=gesetze_im_internet.DEFAULT_COMPRESSLEVEL,
+                           write_law_files=True):
     """
     Generate and upload bulk law files.
     """
     with db.session_scope() as session:
-        gesetze_im_internet.generate_static_assets(session, output_dir)
+        gesetze_im_internet.generate_static_assets(
+            session, output_dir, compresslevel=compresslevel, write_law_files=write_law_files
+        )
 
 
 ns.add_collection(Collection(
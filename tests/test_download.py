@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+from gadi.gesetze_im_internet import _check_for_updates_concurrently, _map_concurrently
+
+
+def test_check_for_updates_concurrently():
+    slugs = [f"law_{i}" for i in range(100)]
+    updated = _check_for_updates_concurrently(slugs, lambda slug: slug.endswith("0"))
+
+    assert updated == {slug for slug in slugs if slug.endswith("0")}
+
+
+def test_map_concurrently_raises_and_cancels_remaining_calls():
+    called = []
+
+    def fn(n):
+        called.append(n)
+        if n == 0:
+            raise ValueError("failed")
+        time.sleep(0.01)
+        return n
+
+    with pytest.raises(ValueError, match="failed"):
+        for _ in _map_concurrently(fn, range(200), "Testing"):
+            pass
+
+    assert 0 in called
+    assert len(called) < 200
@@ -1,8 +1,11 @@
+import gzip
 import json
+import shutil
+import tarfile
 
 import pytest
 
-from gadi import api_schemas, db, gesetze_im_internet
+from gadi import api_schemas, db, gesetze_im_internet, models
 from gadi.gesetze_im_internet.download import location_from_string
 from .utils import load_example_json, xml_fixtures_dir
 
@@ -26,3 +29,79 @@ def test_examples(slug):
 
     expected = load_example_json(slug)["data"]
     assert parsed == expected
+
+
+def test_reingesting_a_law_updates_it_in_place():
+    slug = "alg"
+    data_location = location_from_string(xml_fixtures_dir)
+
+    def ingest_and_load():
+        with db.session_scope() as session:
+            gesetze_im_internet.ingest_law(session, data_location, slug)
+
+        with db.session_scope() as session:
+            law = db.find_law_by_slug(session, slug)
+            parsed = json.loads(api_schemas.LawAllFields.from_orm_model(law, include_contents=True).json(indent=2))
+            return law.id, len(law.contents), len(law.attachments), parsed
+
+    law_id, contents_count, attachments_count, _ = ingest_and_load()
+    assert contents_count > 0
+    assert attachments_count > 0
+
+    assert ingest_and_load() == (law_id, contents_count, attachments_count, load_example_json(slug)["data"])
+
+
+def test_ingest_deletes_removed_laws(tmp_path):
+    slug = "jfdg"
+    data_dir = tmp_path / "gii_xml"
+    shutil.copytree(xml_fixtures_dir, data_dir)
+    data_location = location_from_string(str(data_dir))
+
+    with db.session_scope() as session:
+        gesetze_im_internet.ingest_data_from_location(session, data_location)
+        law_id = db.find_law_by_slug(session, slug).id
+
+    shutil.rmtree(data_dir / slug)
+    with db.session_scope() as session:
+        gesetze_im_internet.ingest_data_from_location(session, data_location)
+
+    with db.session_scope() as session:
+        assert db.find_law_by_slug(session, slug) is None
+        assert session.query(models.ContentItem).filter_by(law_id=law_id).count() == 0
+
+
+@pytest.mark.parametrize("write_law_files,compresslevel", [(True, 6), (False, 1)])
+def test_generate_static_assets(tmp_path, write_law_files, compresslevel):
+    with db.session_scope() as session:
+        gesetze_im_internet.ingest_data_from_location(session, location_from_string(xml_fixtures_dir))
+
+    with db.session_scope() as session:
+        gesetze_im_internet.generate_static_assets(
+            session, str(tmp_path), compresslevel=compresslevel, write_law_files=write_law_files
+        )
+
+    with gzip.open(tmp_path / "all_laws.json.gz") as f:
+        bundle = json.load(f)["data"]
+    assert sorted(law["slug"] for law in bundle) == sorted(example_law_slugs)
+
+    with tarfile.open(tmp_path / "all_laws.tar.gz") as tf:
+        members = tf.getmembers()
+        tar_files = {m.name: tf.extractfile(m).read() for m in members if m.isfile()}
+
+    # The tar holds the laws in the same order as the bundle, followed by the index.
+    assert [m.name for m in members] == (
+        ["laws"] + [f"laws/{law['slug']}.json" for law in bundle] + ["laws/__index.json"]
+    )
+    for law in bundle:
+        assert json.loads(tar_files[f"laws/{law['slug']}.json"]) == {"data": law}
+
+    index = json.loads(tar_files["laws/__index.json"])
+    assert [entry["slug"] for entry in index] == [
+        law["slug"] for law in sorted(bundle, key=lambda law: law["abbreviation"])
+    ]
+
+    if write_law_files:
+        law_files = {f"laws/{path.name}": path.read_bytes() for path in (tmp_path / "laws").iterdir()}
+        assert law_files == tar_files
+    else:
+        assert not (tmp_path / "laws").exists()
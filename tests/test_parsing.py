@@ -1,10 +1,12 @@
 from unittest import mock
 
-from gadi.gesetze_im_internet.parsing import parse_law
+import pytest
+
+from gadi.gesetze_im_internet.parsing import _find_parent, parse_law
 
 
 def test_parser():
-    mock_open = mock.mock_open(read_data=XML_DATA)
+    mock_open = mock.mock_open(read_data=XML_DATA.encode("utf-8"))
     with mock.patch("gadi.gesetze_im_internet.parsing.open", mock_open):
         law = parse_law("mock/xml/path.xml")
 
@@ -178,6 +180,28 @@ def test_parser():
     assert item["parent"] is None
 
 
+def test_parser_rejects_file_without_norms():
+    mock_open = mock.mock_open(read_data=b'<?xml version="1.0" encoding="UTF-8"?><dokumente></dokumente>')
+    with mock.patch("gadi.gesetze_im_internet.parsing.open", mock_open):
+        with pytest.raises(ValueError, match="mock/xml/empty.xml"):
+            parse_law("mock/xml/empty.xml")
+
+
+
+def test_find_parent():
+    section = {"doknr": "section"}
+    subsection = {"doknr": "subsection"}
+    sections_by_code = {"010": section, "010020": subsection}
+
+    assert _find_parent(sections_by_code, "010020") is subsection
+    assert _find_parent(sections_by_code, "010020030") is subsection
+    assert _find_parent(sections_by_code, "010030") is section
+    assert _find_parent(sections_by_code, "020") is None
+
+    # An incomplete trailing group of digits is ignored.
+    assert _find_parent(sections_by_code, "01002") is section
+    assert _find_parent(sections_by_code, "0100203") is subsection
+
 XML_DATA = """\
 <?xml version="1.0" encoding="UTF-8" ?><!DOCTYPE dokumente SYSTEM "http://www.gesetze-im-internet.de/dtd/1.01/gii-norm.dtd">
 <dokumente builddate="20200722212521" doknr="BJNR055429995"><norm builddate="20200722212521" doknr="BJNR055429995"><metadaten><jurabk>SkAufG</jurabk><amtabk>SkAufG</amtabk><ausfertigung-datum manuell="ja">1995-07-20</ausfertigung-datum><fundstelle typ="amtlich"><periodikum>BGBl II</periodikum><zitstelle>1995, 554</zitstelle></fundstelle><kurzue>Streitkräfteaufenthaltsgesetz</kurzue><langue>Gesetz über die Rechtsstellung ausländischer Streitkräfte bei